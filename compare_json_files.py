@@ -6,48 +6,141 @@ import datetime
 import sys
 import shutil
 import argparse
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def ensure_backup_dir():
     """Ensure backup directory exists"""
     backup_dir = "backup"
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
+    os.makedirs(backup_dir, exist_ok=True)
     return backup_dir
 
+_ORJSON_INT_MIN = -(1 << 63)
+_ORJSON_INT_MAX = (1 << 64) - 1
+_ORJSON_FLOAT_LIMIT = float(1 << 63)
+
+def load_json(path):
+    """Read and parse a JSON file, using orjson when available"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            content = f.read()
+        try:
+            data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than the stdlib (it rejects NaN and
+            # Infinity), so only treat the file as invalid if json rejects
+            # it too
+            pass
+        else:
+            if _orjson_exact(data):
+                return data
+        return json.loads(content.decode('utf-8'))
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _orjson_exact(data):
+    """Check that orjson reads and writes every value in data unchanged"""
+    # orjson writes NaN/Infinity as null, cannot write integers beyond 64
+    # bits, and reads such integers as floats without raising. Floats at
+    # or beyond 2**63 are therefore treated as possibly mangled integers
+    t = type(data)
+    if t is dict:
+        values = data.values()
+    elif t is list:
+        values = data
+    else:
+        values = (data,)
+    for v in values:
+        tv = type(v)
+        if tv is dict or tv is list:
+            if not _orjson_exact(v):
+                return False
+        elif tv is float:
+            if not math.isfinite(v) or abs(v) >= _ORJSON_FLOAT_LIMIT:
+                return False
+        elif tv is int:
+            if not _ORJSON_INT_MIN <= v <= _ORJSON_INT_MAX:
+                return False
+    return True
+
+def dump_json(data):
+    """Serialize data to indented UTF-8 JSON bytes with sorted keys, using orjson when available"""
+    if orjson is not None and _orjson_exact(data):
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+_CONTAINER_TYPES = (dict, list)
+
+def _sorted_keys_view(x):
+    """Copy of x with every nested dict rebuilt in sorted key order"""
+    t = type(x)
+    if t is dict:
+        return {k: _sorted_keys_view(v) for k, v in sorted(x.items())}
+    if t is list:
+        return [_sorted_keys_view(v) for v in x]
+    return x
+
+def _sort_key(x):
+    """Sort key for list items"""
+    # Dicts are keyed by the stdlib's ASCII-escaped JSON text on both paths;
+    # orjson emits raw UTF-8, which would order non-ASCII values differently
+    # depending on whether it is installed
+    t = type(x)
+    if t is dict:
+        return json.dumps(x, sort_keys=True)
+    # format_json leaves dict keys in their original order, so nested lists
+    # are keyed on a sorted-keys copy to render dicts the way str() saw them
+    # when dicts were rebuilt sorted
+    if t is list:
+        return str(_sorted_keys_view(x))
+    return str(x)
+
 def format_json(data):
-    """Format JSON data with consistent indentation and sorting"""
-    if isinstance(data, list):
+    """Sort the lists in JSON data in place and return it (dict keys are sorted by dump_json)"""
+    # Parsed JSON only ever contains plain dicts and lists, so exact type
+    # checks are enough and avoid isinstance() on every node
+    t = type(data)
+    if t is list:
         # Special case for coordinates - don't sort them
-        if len(data) == 2 and all(isinstance(x, str) and any(c.isdigit() for c in x) for x in data):
+        if len(data) == 2 and all(type(x) is str and any(c.isdigit() for c in x) for x in data):
             return data
-        return sorted([format_json(item) if isinstance(item, (dict, list)) else item for item in data], 
-                     key=lambda x: json.dumps(x) if isinstance(x, dict) else str(x))
-    elif isinstance(data, dict):
-        return {k: format_json(v) if isinstance(v, (dict, list)) else v for k, v in sorted(data.items())}
+        for item in data:
+            if type(item) in _CONTAINER_TYPES:
+                format_json(item)
+        # The key is computed once per item, not once per comparison
+        data.sort(key=_sort_key)
+    elif t is dict:
+        for v in data.values():
+            if type(v) in _CONTAINER_TYPES:
+                format_json(v)
     return data
 
+def _preview(center, limit=200):
+    """Short JSON rendering of a whole center for the added/deleted CSV rows"""
+    return json.dumps(center, ensure_ascii=False)[:limit]
+
 def extract_centers_by_branch_code(json_data):
     """Extract centers from JSON data and index them by branch_code"""
     # Check if the JSON has a 'data' field (containing centers)
-    if isinstance(json_data, dict) and 'data' in json_data:
+    if type(json_data) is dict and 'data' in json_data:
         centers = json_data['data']
-    elif isinstance(json_data, list):
+    elif type(json_data) is list:
         centers = json_data
     else:
         centers = []
         
     # Create a dictionary with branch_code as key
-    centers_dict = {}
-    for center in centers:
-        if isinstance(center, dict) and 'branch_code' in center:
-            centers_dict[center['branch_code']] = center
-            
-    return centers_dict
+    return {center['branch_code']: center for center in centers
+            if type(center) is dict and 'branch_code' in center}
 
 def compare_centers(old_centers, new_centers):
     """
     Compare centers between old and new JSON data based on branch_code field
-    Returns lists of added, deleted, and modified entries with detailed field changes
+    Yields rows for added, deleted, and modified entries with detailed field changes
     """
     # Find added, deleted and common branch_codes
     old_branch_codes = set(old_centers.keys())
@@ -57,28 +150,25 @@ def compare_centers(old_centers, new_centers):
     deleted_branch_codes = old_branch_codes - new_branch_codes
     common_branch_codes = old_branch_codes.intersection(new_branch_codes)
     
-    # Prepare results
-    comparison_results = []
-    
     # Process added entries
     for branch_code in added_branch_codes:
-        comparison_results.append({
+        yield {
             'ChangeType': 'Added',
             'branch_code': branch_code,
             'FieldName': '',
             'OldValue': '',
-            'NewValue': json.dumps(new_centers[branch_code], ensure_ascii=False)[:200]
-        })
+            'NewValue': _preview(new_centers[branch_code])
+        }
     
     # Process deleted entries
     for branch_code in deleted_branch_codes:
-        comparison_results.append({
+        yield {
             'ChangeType': 'Deleted',
             'branch_code': branch_code,
             'FieldName': '',
-            'OldValue': json.dumps(old_centers[branch_code], ensure_ascii=False)[:200],
+            'OldValue': _preview(old_centers[branch_code]),
             'NewValue': ''
-        })
+        }
     
     # Process modified entries
     for branch_code in common_branch_codes:
@@ -87,75 +177,77 @@ def compare_centers(old_centers, new_centers):
         
         # Compare centers field by field
         if old_center != new_center:
-            # Get all unique fields from both centers
-            all_fields = set(old_center.keys()).union(set(new_center.keys()))
-            modified = False
+            # Split the fields once with set algebra instead of probing both
+            # centers for every field
+            old_fields = old_center.keys()
+            new_fields = new_center.keys()
             
-            for field in all_fields:
+            # Fields present on both sides whose values differ; equal
+            # fields, including unchanged nested dicts like 'address',
+            # are skipped without being walked key by key
+            for field in old_fields & new_fields:
+                old_field_value = old_center[field]
+                new_field_value = new_center[field]
+                if old_field_value == new_field_value:
+                    continue
+                
                 # Handle nested fields like 'address'
-                if field in old_center and field in new_center:
-                    if isinstance(old_center[field], dict) and isinstance(new_center[field], dict):
-                        # Compare nested dictionary
-                        nested_fields = set(old_center[field].keys()).union(set(new_center[field].keys()))
+                if type(old_field_value) is dict and type(new_field_value) is dict:
+                    # Compare nested dictionary
+                    nested_fields = old_field_value.keys() | new_field_value.keys()
+                    
+                    for nested_field in nested_fields:
+                        old_value = old_field_value.get(nested_field, '')
+                        new_value = new_field_value.get(nested_field, '')
                         
-                        for nested_field in nested_fields:
-                            old_value = old_center[field].get(nested_field, '')
-                            new_value = new_center[field].get(nested_field, '')
-                            
-                            if old_value != new_value:
-                                modified = True
-                                comparison_results.append({
-                                    'ChangeType': 'Modified',
-                                    'branch_code': branch_code,
-                                    'FieldName': f"{field}.{nested_field}",
-                                    'OldValue': str(old_value),
-                                    'NewValue': str(new_value)
-                                })
-                    # Handle array fields like 'coords'
-                    elif isinstance(old_center[field], list) and isinstance(new_center[field], list):
-                        if old_center[field] != new_center[field]:
-                            modified = True
-                            comparison_results.append({
+                        if old_value != new_value:
+                            yield {
                                 'ChangeType': 'Modified',
                                 'branch_code': branch_code,
-                                'FieldName': field,
-                                'OldValue': str(old_center[field]),
-                                'NewValue': str(new_center[field])
-                            })
-                    # Handle scalar fields
-                    elif old_center[field] != new_center[field]:
-                        modified = True
-                        comparison_results.append({
-                            'ChangeType': 'Modified',
-                            'branch_code': branch_code,
-                            'FieldName': field,
-                            'OldValue': str(old_center[field]),
-                            'NewValue': str(new_center[field])
-                        })
-                
-                # Field exists in old but not in new
-                elif field in old_center:
-                    modified = True
-                    comparison_results.append({
+                                'FieldName': f"{field}.{nested_field}",
+                                'OldValue': str(old_value),
+                                'NewValue': str(new_value)
+                            }
+                # Handle array fields like 'coords' and scalar fields
+                else:
+                    yield {
                         'ChangeType': 'Modified',
                         'branch_code': branch_code,
                         'FieldName': field,
-                        'OldValue': str(old_center[field]),
-                        'NewValue': '<FIELD_REMOVED>'
-                    })
-                
-                # Field exists in new but not in old
-                elif field in new_center:
-                    modified = True
-                    comparison_results.append({
-                        'ChangeType': 'Modified',
-                        'branch_code': branch_code,
-                        'FieldName': field,
-                        'OldValue': '<FIELD_ADDED>',
-                        'NewValue': str(new_center[field])
-                    })
-    
-    return comparison_results
+                        'OldValue': str(old_field_value),
+                        'NewValue': str(new_field_value)
+                    }
+            
+            # Field exists in old but not in new
+            for field in old_fields - new_fields:
+                yield {
+                    'ChangeType': 'Modified',
+                    'branch_code': branch_code,
+                    'FieldName': field,
+                    'OldValue': str(old_center[field]),
+                    'NewValue': '<FIELD_REMOVED>'
+                }
+            
+            # Field exists in new but not in old
+            for field in new_fields - old_fields:
+                yield {
+                    'ChangeType': 'Modified',
+                    'branch_code': branch_code,
+                    'FieldName': field,
+                    'OldValue': '<FIELD_ADDED>',
+                    'NewValue': str(new_center[field])
+                }
+
+def tally_changes(rows, change_counts, modified_branches):
+    """Pass comparison rows through while counting rows per change type and modified branch codes"""
+    for row in rows:
+        change_type = row['ChangeType']
+        change_counts[change_type] += 1
+        # Added and Deleted produce exactly one row per branch, so only
+        # Modified rows need de-duplicating by branch_code
+        if change_type == 'Modified':
+            modified_branches.add(row['branch_code'])
+        yield row
 
 def main():
     try:
@@ -190,42 +282,30 @@ def main():
         formatted_source_filename = f"formatted_source_{timestamp}.json"
         formatted_source_file = os.path.join(backup_dir, formatted_source_filename)
         
-        # Check if files exist
-        if not os.path.exists(new_file):
-            raise FileNotFoundError(f"Source file '{new_file}' not found")
-            
-        if not os.path.exists(old_file):
+        # Read new data. Missing files are detected by opening them rather
+        # than with a separate os.path.exists() check, saving a stat per file
+        print(f"Reading new file: {new_file}")
+        try:
+            new_data = load_json(new_file)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Source file '{new_file}' not found") from None
+        
+        # Read old data
+        print(f"Reading old file: {old_file}")
+        try:
+            old_data = load_json(old_file)
+        except FileNotFoundError:
             print(f"Warning: Target file '{old_file}' not found. Will create a new file.")
             old_data = {}
+        except json.JSONDecodeError:
+            print(f"Warning: Target file '{old_file}' contains invalid JSON. Will create a new file.")
+            old_data = {}
         else:
-            # Read old data
-            print(f"Reading old file: {old_file}")
-            try:
-                with open(old_file, 'r', encoding='utf-8') as f:
-                    old_data = json.load(f)
-                
-                # Create a backup of the old file
-                old_backup_filename = f"backup_{os.path.basename(old_file)}"
-                old_backup = os.path.join(backup_dir, old_backup_filename)
-                print(f"Creating backup of old file: {old_backup}")
-                shutil.copy2(old_file, old_backup)
-            except json.JSONDecodeError:
-                print(f"Warning: Target file '{old_file}' contains invalid JSON. Will create a new file.")
-                old_data = {}
-        
-        # Read new data
-        print(f"Reading new file: {new_file}")
-        with open(new_file, 'r', encoding='utf-8') as f:
-            new_data = json.load(f)
-        
-        # Format the new data
-        print("Formatting source data...")
-        formatted_source_data = format_json(new_data)
-        
-        # Write formatted source data to a temporary file for reference
-        print(f"Writing formatted source data to temporary file: {formatted_source_file}")
-        with open(formatted_source_file, 'w', encoding='utf-8') as f:
-            json.dump(formatted_source_data, f, indent=2, ensure_ascii=False)
+            # Create a backup of the old file
+            old_backup_filename = f"backup_{os.path.basename(old_file)}"
+            old_backup = os.path.join(backup_dir, old_backup_filename)
+            print(f"Creating backup of old file: {old_backup}")
+            shutil.copy2(old_file, old_backup)
         
         # Extract centers indexed by branch_code
         print("Extracting centers by branch_code...")
@@ -237,41 +317,49 @@ def main():
         
         # Compare the centers
         print("Comparing centers by branch_code...")
-        comparison_results = compare_centers(old_centers, new_centers)
-        
-        # Categorize results for summary
-        added = [result for result in comparison_results if result['ChangeType'] == 'Added']
-        deleted = [result for result in comparison_results if result['ChangeType'] == 'Deleted']
-        modified = [result for result in comparison_results if result['ChangeType'] == 'Modified']
         
-        # Write comparison results to CSV
+        # Write comparison results to CSV as they are produced, tallying the
+        # summary counts on the way instead of collecting every row first
         print(f"Writing comparison results to: {comparison_file}")
-        with open(comparison_file, 'w', newline='', encoding='utf-8') as f:
+        change_counts = {'Added': 0, 'Deleted': 0, 'Modified': 0}
+        modified_branch_codes = set()
+        with open(comparison_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
             writer = csv.DictWriter(f, fieldnames=[
                 'ChangeType', 'branch_code', 'FieldName', 'OldValue', 'NewValue'
             ])
             writer.writeheader()
-            
-            # Write all results
-            for result in comparison_results:
-                writer.writerow(result)
+            writer.writerows(tally_changes(compare_centers(old_centers, new_centers),
+                                           change_counts, modified_branch_codes))
+        
+        # Format the new data in place. This happens after the comparison so
+        # that the CSV reflects list fields in their original order
+        print("Formatting source data...")
+        format_json(new_data)
+        
+        # Write formatted source data to a temporary file for reference
+        print(f"Writing formatted source data to temporary file: {formatted_source_file}")
+        # Serialize once; the same bytes are written to the target file below
+        formatted_source_json = dump_json(new_data)
+        with open(formatted_source_file, 'wb') as f:
+            f.write(formatted_source_json)
         
         # Copy the formatted source data to the target file (unless --no-update is specified)
         if not args.no_update:
             print(f"Copying formatted data to target file: {old_file}")
-            with open(old_file, 'w', encoding='utf-8') as f:
-                json.dump(formatted_source_data, f, indent=2, ensure_ascii=False)
+            with open(old_file, 'wb') as f:
+                f.write(formatted_source_json)
         
         # Print summary
-        added_branches = len(set([result['branch_code'] for result in added]))
-        deleted_branches = len(set([result['branch_code'] for result in deleted]))
-        modified_branches = len(set([result['branch_code'] for result in modified]))
+        added_branches = change_counts['Added']
+        deleted_branches = change_counts['Deleted']
+        modified_branches = len(modified_branch_codes)
+        modified_fields = change_counts['Modified']
         
         print(f"Comparison completed successfully.")
         print(f"Added branches: {added_branches}")
         print(f"Deleted branches: {deleted_branches}")
         print(f"Modified branches: {modified_branches}")
-        print(f"Total field modifications: {len(modified)}")
+        print(f"Total field modifications: {modified_fields}")
         print(f"Results saved to {comparison_file}")
         
         if not args.no_update:
@@ -284,10 +372,11 @@ def main():
         # Try to write error to a log file
         try:
             backup_dir = ensure_backup_dir()
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            now = datetime.datetime.now()
+            timestamp = now.strftime("%Y%m%d_%H%M%S")
             error_file = os.path.join(backup_dir, f"error_{timestamp}.log")
             with open(error_file, 'w', encoding='utf-8') as f:
-                f.write(f"Timestamp: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"Timestamp: {now.strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(f"Error: {str(e)}\n")
             print(f"Error details written to: {error_file}", file=sys.stderr)
         except Exception as e2:
@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+
+import pytest
+
+import compare_json_files
+from compare_json_files import dump_json, format_json
+
+
+def test_format_json_orders_non_ascii_values_like_stdlib_json():
+    # json.dumps escapes "é" as "\u00e9", which sorts before "z"
+    data = [{"name": "z"}, {"name": "é"}]
+    assert format_json(data) == [{"name": "é"}, {"name": "z"}]
+
+
+def test_format_json_orders_nested_lists_by_sorted_dict_keys():
+    data = [[{"z": 1, "a": 2}], [{"b": 1, "a": 3}]]
+    assert dump_json(format_json(data)) == dump_json([[{"a": 2, "z": 1}], [{"a": 3, "b": 1}]])
+
+
+def test_formatted_output_does_not_depend_on_orjson(monkeypatch):
+    def formatted():
+        return dump_json(format_json({"data": [
+            {"name": "z", "branch_code": "2"},
+            {"name": "é", "branch_code": "1"},
+            {"name": "Ω", "branch_code": "3"},
+        ]}))
+
+    with_orjson = formatted()
+    monkeypatch.setattr(compare_json_files, "orjson", None)
+    assert formatted() == with_orjson
+
+
+def test_load_json_accepts_nan_like_stdlib_json(tmp_path):
+    path = tmp_path / "old.json"
+    path.write_text('{"data":[{"branch_code":"1","v":NaN}]}', encoding="utf-8")
+    centers = compare_json_files.extract_centers_by_branch_code(compare_json_files.load_json(path))
+    assert list(centers) == ["1"]
+
+
+def test_main_compares_list_fields_in_original_order(tmp_path, monkeypatch):
+    center = {"branch_code": "1", "tags": ["b", "a"]}
+    (tmp_path / "old.json").write_text(json.dumps({"data": [center]}), encoding="utf-8")
+    (tmp_path / "new.json").write_text(json.dumps({"data": [center]}), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["compare_json_files.py", "--old", "old.json",
+                                      "--new", "new.json", "--output", "changes.csv"])
+
+    compare_json_files.main()
+
+    rows = list(csv.DictReader((tmp_path / "changes.csv").open(encoding="utf-8")))
+    assert rows == []
+    assert json.loads((tmp_path / "old.json").read_text(encoding="utf-8"))["data"][0]["tags"] == ["a", "b"]
+
+
+@pytest.mark.parametrize("value", ["123456789012345678901234", "-123456789012345678901234", "NaN", "Infinity"])
+def test_main_writes_values_orjson_cannot_represent_unchanged(tmp_path, monkeypatch, value):
+    (tmp_path / "new.json").write_text('{"data":[{"branch_code":"1","v":%s}]}' % value, encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["compare_json_files.py", "--old", "old.json",
+                                      "--new", "new.json", "--output", "changes.csv"])
+
+    compare_json_files.main()
+
+    assert '"v": %s' % value in (tmp_path / "old.json").read_text(encoding="utf-8")